@@ -7,21 +7,28 @@ import json
 import uuid
 import shutil
 from pathlib import Path
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict
 
 import pandas as pd
 import streamlit as st
-from subprocess import Popen
+from subprocess import Popen, STDOUT, DEVNULL
 
 # ─────────────────────────── Config general ───────────────────────────
 st.set_page_config(page_title="SiReset", layout="wide")
+APP_ROOT = Path(__file__).parent.resolve()
+HEADER_IMG = APP_ROOT / "assets" / "Encabezado.png"
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _header_bytes(path: str, mtime_ns: int) -> bytes:
+    # Se lee una vez por versión del archivo; los reruns reutilizan los mismos bytes
+    return Path(path).read_bytes()
+
 try:
-    st.image("assets/Encabezado.png", width="stretch")
+    st.image(_header_bytes(str(HEADER_IMG), HEADER_IMG.stat().st_mtime_ns), width="stretch")
 except Exception:
     pass
 
-APP_ROOT = Path(__file__).parent.resolve()
 for p in (APP_ROOT, APP_ROOT / "core"):
     sp = str(p)
     if sp not in sys.path:
@@ -37,8 +44,20 @@ try:
 except Exception:
     pass
 
+@st.cache_resource(show_spinner=False)
+def _base_cmd() -> tuple:
+    # Comando base del worker: se resuelve una vez por proceso (core no cambia en runtime)
+    if (CORE_DIR / "__init__.py").exists() and (CORE_DIR / "mougli_core.py").exists():
+        return (sys.executable, "-m", "core.mougli_core")
+    script_path = CORE_DIR / "mougli_core.py"
+    if not script_path.exists():
+        script_path = APP_ROOT / "mougli_core.py"
+    return (sys.executable, str(script_path))
+
 # ───────────────────── Imports de auth y core robustos ───────────────────────
+@st.cache_resource(show_spinner=False)
 def _import_mougli_core():
+    # Una resolución por proceso: los reruns no reintentan rutas que ya fallaron
     try:
         import core.mougli_core as mc
         return mc, "pkg"
@@ -50,11 +69,18 @@ def _import_mougli_core():
     except Exception as e2:
         err2 = f"mougli_core: {e2}"
     try:
-        from importlib.machinery import SourceFileLoader
+        import importlib.util
         mod_path = CORE_DIR / "mougli_core.py"
         if not mod_path.exists():
             mod_path = APP_ROOT / "mougli_core.py"
-        mc = SourceFileLoader("mougli_core", str(mod_path)).load_module()
+        spec = importlib.util.spec_from_file_location("mougli_core", mod_path)
+        mc = importlib.util.module_from_spec(spec)
+        sys.modules["mougli_core"] = mc
+        try:
+            spec.loader.exec_module(mc)
+        except Exception:
+            sys.modules.pop("mougli_core", None)
+            raise
         return mc, "path"
     except Exception as e3:
         st.error(
@@ -111,92 +137,135 @@ save_outview_factor = require_any("save_outview_factor")
 
 # ───────────────────────── Helpers y constantes ──────────────────────────────
 JOBS_DIR = APP_ROOT / "jobs"
+MAPITO_DATA_DIR = APP_ROOT / "data"
 JOBS_DIR.mkdir(exist_ok=True)
+UPLOAD_COPY_BUFFER = 8 * 1024 * 1024
+
+ROLES = ("admin", "programmer", "user")
+ROLE_IDX = {r: i for i, r in enumerate(ROLES)}
 
-BAD_TIPOS = {
+BAD_TIPOS = frozenset({
     "INSERT", "INTERNACIONAL", "OBITUARIO", "POLITICO",
     "AUTOAVISO", "PROMOCION CON AUSPICIO", "PROMOCION SIN AUSPICIO"
-}
+})
 
-HIDE_OUT_PREVIEW = {
-    "Código único","Denominador","Código +1 pieza","Tarifa × Superficie",
-    "Semana en Mes por Código","NB_EXTRAE_6_7","Fecha_AB","Proveedor_AC",
-    "TipoElemento_AD","Distrito_AE","Avenida_AF","NroCalleCuadra_AG","OrientacionVia_AH",
-    "Marca_AI","Conteo_AB_AI","Conteo_Z_AB_AI","TarifaS_div3","TarifaS_div3_sobre_Conteo",
-    "Suma_AM_Z_AB_AI","TopeTipo_AQ","Suma_AM_Topada_Tipo","SumaTopada_div_ConteoZ",
-    "K_UNICO","K_PIEZA"
-}
 
 def _unique_list_str(series, max_items=50):
     if series is None:
         return "—"
-    vals = (
-        series.astype(str)
-        .str.strip()
-        .replace({"nan": ""})
-        .dropna()
-        .loc[lambda s: s.str.len() > 0]
-        .unique()
-        .tolist()
-    )
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Solo las categorías realmente usadas (vía códigos): O(n_categorías) en strings
+        codes = pd.unique(series.cat.codes.to_numpy())
+        raw = series.cat.categories.take(codes[codes >= 0])
+    else:
+        # Un único pase hash sobre la columna; el trabajo en strings es sobre los únicos
+        raw = pd.unique(series.dropna().to_numpy())
+    vals = list({s for s in (str(v).strip() for v in raw) if s and s.lower() != "nan"})
     if not vals:
         return "—"
-    vals = sorted(set(vals))
+    vals.sort()
     if len(vals) > max_items:
         return ", ".join(vals[:max_items]) + f" … (+{len(vals)-max_items} más)"
     return ", ".join(vals)
 
+_TIPO_COLS = ("TIPO ELEMENTO", "TIPO", "Tipo Elemento")
+
 def _web_resumen_enriquecido(df: Optional[pd.DataFrame], *, es_monitor: bool) -> pd.DataFrame:
     base = resumen_mougli(df, es_monitor=es_monitor) if df is not None else None
     if base is None or base.empty:
         base = pd.DataFrame([{"Filas": 0, "Rango de fechas": "—", "Marcas / Anunciantes": 0}])
-    base_vertical = pd.DataFrame({"Descripción": base.columns, "Valor": base.iloc[0].tolist()})
+    rows = list(zip(base.columns, base.iloc[0].tolist()))
 
-    cat_col = "CATEGORIA" if es_monitor else ("Categoría" if (df is not None and "Categoría" in df.columns) else None)
-    reg_col = "REGION/ÁMBITO" if es_monitor else ("Región" if (df is not None and "Región" in df.columns) else None)
-    tipo_cols = ["TIPO ELEMENTO", "TIPO", "Tipo Elemento"]
-    tipo_col = next((c for c in tipo_cols if (df is not None and c in df.columns)), None)
+    cols = frozenset(df.columns) if df is not None else frozenset()
+    cat_col = "CATEGORIA" if es_monitor else "Categoría"
+    reg_col = "REGION/ÁMBITO" if es_monitor else "Región"
+    tipo_col = next((c for c in _TIPO_COLS if c in cols), None)
 
-    extras_rows = []
     if df is not None and not df.empty:
-        if cat_col:
-            extras_rows.append({"Descripción": "Categorías (únicas)", "Valor": _unique_list_str(df[cat_col])})
-        if reg_col:
-            extras_rows.append({"Descripción": "Regiones (únicas)", "Valor": _unique_list_str(df[reg_col])})
+        if cat_col in cols:
+            rows.append(("Categorías (únicas)", _unique_list_str(df[cat_col])))
+        if reg_col in cols:
+            rows.append(("Regiones (únicas)", _unique_list_str(df[reg_col])))
         if tipo_col:
-            extras_rows.append({"Descripción": "Tipos de elemento (únicos)", "Valor": _unique_list_str(df[tipo_col])})
-
-    if extras_rows:
-        base_vertical = pd.concat([base_vertical, pd.DataFrame(extras_rows)], ignore_index=True)
-
-    return base_vertical
-
-def _preview_df(df: Optional[pd.DataFrame]) -> pd.DataFrame:
-    if df is None or df.empty:
-        return pd.DataFrame()
-    normalized_hide = {c.strip().lower() for c in HIDE_OUT_PREVIEW}
-    cols_to_drop = [c for c in df.columns if c and c.strip().lower() in normalized_hide]
-    return df.drop(columns=cols_to_drop, errors="ignore").copy()
+            rows.append(("Tipos de elemento (únicos)", _unique_list_str(df[tipo_col])))
+
+    # Una sola construcción (sin concat de dos DataFrames pequeños)
+    return pd.DataFrame(rows, columns=["Descripción", "Valor"])
+
+def _files_key(paths: List[Path]) -> tuple:
+    # (ruta, mtime_ns, tamaño) por archivo: cualquier cambio en la bandeja invalida el caché
+    out = []
+    for p in paths:
+        s = p.stat()
+        out.append((str(p), s.st_mtime_ns, s.st_size))
+    return tuple(out)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _resumen_monitor_staged(files_key: tuple) -> pd.DataFrame:
+    paths = [Path(k[0]) for k in files_key]
+    tmp = None
+    try:
+        if len(paths) == 1:
+            src = paths[0]
+        else:
+            # Concatenación en disco (no en un BytesIO): no duplica el tamaño total en RAM
+            src = tmp = paths[0].parent.parent / "_preview_monitor.txt"
+            with tmp.open("wb") as w:
+                for i, p in enumerate(paths):
+                    if i > 0:
+                        w.write(b"\n")
+                    with p.open("rb") as r:
+                        shutil.copyfileobj(r, w, UPLOAD_COPY_BUFFER)
+        with src.open("rb") as fh:
+            df_m = _read_monitor_txt(fh)
+    finally:
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+    return _web_resumen_enriquecido(df_m, es_monitor=True)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _resumen_outview_staged(files_key: tuple) -> pd.DataFrame:
+    with Path(files_key[0][0]).open("rb") as fh:  # fh.name conserva la extensión (.csv/.xlsx)
+        df_o = _read_out_robusto(fh)
+    return _web_resumen_enriquecido(df_o, es_monitor=False)
 
 # ──────────────────────────── Worker management ───────────────────────────────
+def _list_staged(d: Path) -> List[tuple]:
+    # Una lectura de directorio; DirEntry trae el stat sin syscalls extra por Path
+    try:
+        with os.scandir(d) as it:
+            return sorted((Path(e.path), e.stat().st_size) for e in it if e.is_file())
+    except FileNotFoundError:
+        return []
+
+def _save_one(f, dest: Path) -> Path:
+    with dest.open("wb") as w:
+        if hasattr(f, "getbuffer"):
+            # UploadedFile ya está en memoria: una sola escritura sin copia intermedia
+            w.write(f.getbuffer())
+        else:
+            shutil.copyfileobj(f, w, UPLOAD_COPY_BUFFER)
+    try:
+        f.seek(0)
+    except Exception:
+        pass
+    return dest
+
 def _save_upload_to(job_dir: Path, files, subdir: str) -> List[Path]:
     outdir = job_dir / "uploads" / subdir
     outdir.mkdir(parents=True, exist_ok=True)
-    paths = []
+    # Un archivo por destino (si se repite el nombre gana el último, como antes)
+    por_destino: Dict[Path, object] = {}
     for f in files or []:
         name = getattr(f, "name", f"file-{uuid.uuid4().hex}")
         dest = outdir / name
-        with dest.open("wb") as w:
-            for chunk in iter(lambda: f.read(1024 * 1024), b""):
-                if not chunk:
-                    break
-                w.write(chunk)
-        try:
-            f.seek(0)
-        except Exception:
-            pass
-        paths.append(dest)
-    return paths
+        por_destino.pop(dest, None)
+        por_destino[dest] = f
+    if len(por_destino) <= 1:
+        return [_save_one(f, d) for d, f in por_destino.items()]
+    # write() suelta el GIL: varias subidas grandes se vuelcan a disco en paralelo
+    with ThreadPoolExecutor(max_workers=min(4, len(por_destino))) as ex:
+        return list(ex.map(lambda item: _save_one(item[1], item[0]), por_destino.items()))
 
 def _start_worker(job_dir: Path, mon_paths: List[Path], out_paths: List[Path],
                   factores: Dict[str, float], out_factor: float):
@@ -204,16 +273,7 @@ def _start_worker(job_dir: Path, mon_paths: List[Path], out_paths: List[Path],
     logf = job_dir / "job.log"
     outxlsx = job_dir / "SiReset_Mougli.xlsx"
 
-    core_pkg_ok = (CORE_DIR / "__init__.py").exists() and (CORE_DIR / "mougli_core.py").exists()
-    if core_pkg_ok:
-        base_cmd = [sys.executable, "-m", "core.mougli_core"]
-    else:
-        script_path = CORE_DIR / "mougli_core.py"
-        if not script_path.exists():
-            script_path = APP_ROOT / "mougli_core.py"
-        base_cmd = [sys.executable, str(script_path)]
-
-    args = base_cmd + [
+    args = [*_base_cmd(),
         "--as-worker",
         "--out-xlsx", str(outxlsx),
         "--progress", str(progress),
@@ -227,28 +287,84 @@ def _start_worker(job_dir: Path, mon_paths: List[Path], out_paths: List[Path],
     for p in out_paths:
         args.extend(["--outview", str(p)])
 
-    Popen(args, cwd=str(APP_ROOT))
+    # Progreso inicial ANTES de lanzar: así nunca pisa la primera actualización del worker
     progress.write_text(json.dumps({"status": "running", "step": 0, "total": 6, "message": "Inicializando…"}), encoding="utf-8")
+    # stdout/stderr del worker van al mismo job.log (O_APPEND): tracebacks y prints
+    # quedan en el log que la UI ya muestra. El padre cierra su copia del descriptor.
+    # Sin preexec_fn: CPython lanza con vfork+exec, sin copiar el heap de Streamlit.
+    with logf.open("ab", buffering=0) as log_fh:
+        Popen(args, cwd=str(APP_ROOT), stdout=log_fh, stderr=STDOUT, stdin=DEVNULL,
+              close_fds=True, start_new_session=True)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _progress_cached(path: str, ino: int, mtime_ns: int, size: int) -> Dict:
+    try:
+        return json.loads(Path(path).read_bytes())
+    except FileNotFoundError:
+        return {"status": "unknown", "message": "sin progreso"}
+    except Exception:
+        return {"status": "unknown", "message": "progress.json corrupto"}
 
 def _read_progress(job_dir: Path) -> Dict:
+    # Un stat por refresco; solo se relee y parsea si el worker reemplazó el archivo
+    # (el reemplazo atómico cambia el inodo aunque mtime/tamaño coincidan)
     pj = job_dir / "progress.json"
-    if pj.exists():
-        try:
-            return json.loads(pj.read_text(encoding="utf-8"))
-        except Exception:
-            return {"status": "unknown", "message": "progress.json corrupto"}
-    return {"status": "unknown", "message": "sin progreso"}
+    try:
+        s = pj.stat()
+    except FileNotFoundError:
+        return {"status": "unknown", "message": "sin progreso"}
+    return _progress_cached(str(pj), s.st_ino, s.st_mtime_ns, s.st_size)
 
-def _read_log_tail(job_dir: Path, lines: int = 200) -> str:
-    logf = job_dir / "job.log"
-    if not logf.exists():
-        return ""
+LOG_TAIL_BYTES = 64 * 1024
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _log_tail_cached(path: str, mtime_ns: int, size: int, lines: int) -> str:
+    # Lee solo el final del log (acotado), no el archivo completo
     try:
-        data = logf.read_text(encoding="utf-8", errors="ignore").splitlines()
+        with open(path, "rb") as f:
+            start = max(0, size - LOG_TAIL_BYTES)
+            f.seek(start)
+            data = f.read(size - start).decode("utf-8", errors="ignore").splitlines()
+        if start > 0 and data:
+            data = data[1:]  # la primera línea puede venir cortada
         return "\n".join(data[-lines:])
     except Exception:
         return ""
 
+def _read_log_tail(job_dir: Path, lines: int = 200) -> str:
+    # El log solo crece: (mtime, tamaño) basta para saber si hay líneas nuevas
+    logf = job_dir / "job.log"
+    try:
+        s = logf.stat()
+    except OSError:
+        return ""
+    return _log_tail_cached(str(logf), s.st_mtime_ns, s.st_size, lines)
+
+@st.cache_data(show_spinner=False, ttl=300)
+def _cached_module_codes() -> List[str]:
+    # El catálogo de módulos casi no cambia (solo ensure_builtin_modules lo escribe)
+    return [m["code"] for m in list_all_modules(enabled_only=False)]
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _file_bytes(path: str, mtime_ns: int) -> bytes:
+    # bytes inmutables: cache_resource los comparte sin copiar; mtime invalida si el archivo cambia
+    return Path(path).read_bytes()
+
+def _gadm_version(data_dir: Path) -> tuple:
+    # (nombre, mtime_ns) de cada GADM: si se reemplaza un archivo, el mapa se regenera
+    try:
+        with os.scandir(data_dir) as it:
+            return tuple(sorted((e.name, e.stat().st_mtime_ns) for e in it
+                                if e.name.startswith("gadm41_PER_") and e.name.endswith(".json")))
+    except FileNotFoundError:
+        return ()
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _build_map_cached(data_dir: str, gadm_version: tuple, colores: tuple, style: tuple) -> tuple:
+    # Mismos estilos + mismos archivos => mismo HTML: no se re-serializa el GeoJSON en cada rerun
+    from core.mapito_core import build_map
+    return build_map(Path(data_dir), colores=dict(colores), style=dict(style))
+
 def _clear_job(job_id: str):
     job_dir = JOBS_DIR / job_id
     if job_dir.exists():
@@ -256,6 +372,52 @@ def _clear_job(job_id: str):
     if "job_id" in st.session_state:
         del st.session_state["job_id"]
 
+# Fragmentos (Streamlit ≥1.33): el panel del job se refresca solo, sin rerun de todo el script
+_FRAGMENT = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+# "unknown" = progress.json ausente o corrupto (job limpiado en otra pestaña): no hay nada que sondear
+_JOB_FINAL = ("done", "error", "unknown")
+
+def _job_panel(job_id: str, live: bool = False):
+    job_dir = JOBS_DIR / job_id
+    prog = _read_progress(job_dir)
+    if live and prog.get("status") in _JOB_FINAL:
+        st.rerun()  # rerun completo: el panel final ya no necesita refresco periódico
+    colP, colBtns = st.columns([3,1])
+    with colP:
+        step = int(prog.get("step", 0))
+        total = int(prog.get("total", 6) or 6)
+        st.progress(min(step, total) / max(total, 1), text=prog.get("message", "Procesando…"))
+    with colBtns:
+        if not live and st.button("↻ Actualizar"):
+            st.rerun()
+        if st.button("Cancelar / Limpiar"):
+            _clear_job(job_id)
+            st.rerun()
+
+    with st.expander("Ver registro (log)"):
+        st.code(_read_log_tail(job_dir), language="text")
+
+    if prog.get("status") == "done":
+        outxlsx = job_dir / "SiReset_Mougli.xlsx"
+        if outxlsx.exists():
+            st.success("¡Listo! ✅ Descarga tu Excel.")
+            st.download_button(
+                "Descargar Excel",
+                data=_file_bytes(str(outxlsx), outxlsx.stat().st_mtime_ns),
+                file_name="SiReset_Mougli.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+        else:
+            st.warning("El proceso terminó pero no encontré el archivo de salida.")
+    elif prog.get("status") == "error":
+        st.error(f"El worker reportó un error: {prog.get('message')}")
+
+def _job_panel_live(job_id: str):
+    _job_panel(job_id, live=True)
+
+if _FRAGMENT is not None:
+    _job_panel_live = _FRAGMENT(run_every=2)(_job_panel_live)
+
 # ─────────────────────────────── LOGIN obligatorio ───────────────────────────
 user = current_user()
 if not user:
@@ -286,64 +448,45 @@ app = st.sidebar.radio("Elige aplicación", allowed, index=0)
 # ---------- Factores SOLO visibles en Mougli ----------
 if app == "Mougli":
     st.sidebar.markdown("### Factores")
-    persist_m = load_monitor_factors()
-    persist_o = load_outview_factor()
-    col1, col2 = st.sidebar.columns(2)
-    with col1:
-        f_tv = st.number_input("TV", min_value=0.0, step=0.01, value=float(persist_m.get("TV", 0.255)))
-        f_cable = st.number_input("CABLE", min_value=0.0, step=0.01, value=float(persist_m.get("CABLE", 0.425)))
-        f_radio = st.number_input("RADIO", min_value=0.0, step=0.01, value=float(persist_m.get("RADIO", 0.425)))
-    with col2:
-        f_revista = st.number_input("REVISTA", min_value=0.0, step=0.01, value=float(persist_m.get("REVISTA", 0.14875)))
-        f_diarios = st.number_input("DIARIOS", min_value=0.0, step=0.01, value=float(persist_m.get("DIARIOS", 0.14875)))
-        out_factor = st.number_input("OutView ×Superficie", min_value=0.0, step=0.05, value=float(persist_o))
+    # Se leen de disco una vez por sesión; "Guardar" escribe y actualiza la copia en sesión
+    if "factors_m" not in st.session_state:
+        st.session_state["factors_m"] = load_monitor_factors()
+        st.session_state["factors_o"] = load_outview_factor()
+    persist_m, persist_o = st.session_state["factors_m"], st.session_state["factors_o"]
+    # En un form: editar valores no dispara reruns hasta Aplicar/Guardar
+    with st.sidebar.form("factores"):
+        col1, col2 = st.columns(2)
+        with col1:
+            f_tv = st.number_input("TV", min_value=0.0, step=0.01, value=float(persist_m.get("TV", 0.255)))
+            f_cable = st.number_input("CABLE", min_value=0.0, step=0.01, value=float(persist_m.get("CABLE", 0.425)))
+            f_radio = st.number_input("RADIO", min_value=0.0, step=0.01, value=float(persist_m.get("RADIO", 0.425)))
+        with col2:
+            f_revista = st.number_input("REVISTA", min_value=0.0, step=0.01, value=float(persist_m.get("REVISTA", 0.14875)))
+            f_diarios = st.number_input("DIARIOS", min_value=0.0, step=0.01, value=float(persist_m.get("DIARIOS", 0.14875)))
+            out_factor = st.number_input("OutView ×Superficie", min_value=0.0, step=0.05, value=float(persist_o))
+        st.form_submit_button("Aplicar")
+        guardar = st.form_submit_button("💾 Guardar factores")
     factores = {"TV": f_tv, "CABLE": f_cable, "RADIO": f_radio, "REVISTA": f_revista, "DIARIOS": f_diarios}
-    if st.sidebar.button("💾 Guardar factores"):
+    if guardar:
         save_monitor_factors(factores)
         save_outview_factor(out_factor)
-        st.sidebar.success("Factores guardados.")
+        st.session_state["factors_m"] = dict(factores)
+        st.session_state["factors_o"] = float(out_factor)
+        st.toast("Factores guardados.", icon="💾")
 
 # =============== M O U G L I (con worker) ===============
 if app == "Mougli":
-    import gc
-
     st.markdown("## Mougli – Monitor & OutView (seguro)")
 
     # ---------- Estado de worker en curso ----------
     job_id = st.session_state.get("job_id")
     if job_id:
         job_dir = JOBS_DIR / job_id
-        prog = _read_progress(job_dir)
         st.info(f"Trabajo en curso: `{job_id}`")
-        colP, colBtns = st.columns([3,1])
-        with colP:
-            step = int(prog.get("step", 0))
-            total = int(prog.get("total", 6) or 6)
-            st.progress(min(step, total) / max(total, 1), text=prog.get("message", "Procesando…"))
-        with colBtns:
-            if st.button("↻ Actualizar"):
-                st.rerun()
-            if st.button("Cancelar / Limpiar"):
-                _clear_job(job_id)
-                st.rerun()
-
-        with st.expander("Ver registro (log)"):
-            st.code(_read_log_tail(job_dir), language="text")
-
-        if prog.get("status") == "done":
-            outxlsx = job_dir / "SiReset_Mougli.xlsx"
-            if outxlsx.exists():
-                st.success("¡Listo! ✅ Descarga tu Excel.")
-                st.download_button(
-                    "Descargar Excel",
-                    data=outxlsx.read_bytes(),
-                    file_name="SiReset_Mougli.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                )
-            else:
-                st.warning("El proceso terminó pero no encontré el archivo de salida.")
-        elif prog.get("status") == "error":
-            st.error(f"El worker reportó un error: {prog.get('message')}")
+        if _FRAGMENT is not None and _read_progress(job_dir).get("status") not in _JOB_FINAL:
+            _job_panel_live(job_id)
+        else:
+            _job_panel(job_id)
         st.stop()
 
     # ---------- Estado para nonces de uploaders ----------
@@ -409,35 +552,29 @@ if app == "Mougli":
 
     # ---------- Mostrar bandeja de archivos ya volcados a disco ----------
     jid = st.session_state.get("pending_job_id")
-    mon_paths: List[Path] = []
-    out_paths: List[Path] = []
+    mon_staged: List[tuple] = []
+    out_staged: List[tuple] = []
     if jid:
         job_dir = JOBS_DIR / jid
-        mon_paths = sorted((job_dir / "uploads" / "monitor").glob("*"))
-        out_paths = sorted((job_dir / "uploads" / "outview").glob("*"))
-
-    def _fmt_size(p: Path) -> str:
-        try:
-            b = p.stat().st_size
-        except Exception:
-            b = 0
-        mb = b / (1024*1024)
-        return f"{mb:.1f} MB"
+        mon_staged = _list_staged(job_dir / "uploads" / "monitor")
+        out_staged = _list_staged(job_dir / "uploads" / "outview")
+    mon_paths: List[Path] = [p for p, _ in mon_staged]
+    out_paths: List[Path] = [p for p, _ in out_staged]
 
     st.markdown("#### Archivos preparados")
     colA, colB = st.columns(2)
     with colA:
         st.write("**Monitor**")
-        if mon_paths:
-            for p in mon_paths:
-                st.write(f"• {p.name} — {_fmt_size(p)}")
+        if mon_staged:
+            for p, b in mon_staged:
+                st.write(f"• {p.name} — {b / (1024*1024):.1f} MB")
         else:
             st.caption("— vacío —")
     with colB:
         st.write("**OutView**")
-        if out_paths:
-            for p in out_paths:
-                st.write(f"• {p.name} — {_fmt_size(p)}")
+        if out_staged:
+            for p, b in out_staged:
+                st.write(f"• {p.name} — {b / (1024*1024):.1f} MB")
         else:
             st.caption("— vacío —")
 
@@ -457,7 +594,7 @@ if app == "Mougli":
                     _start_worker(JOBS_DIR / jid, mon_paths, out_paths, factores, out_factor)
                     st.session_state["job_id"] = jid
                     st.session_state.pop("pending_job_id", None)
-                    st.success("Trabajo lanzado. Puedes seguir usando la app.")
+                    st.toast("Trabajo lanzado. Puedes seguir usando la app.", icon="🚀")
                     st.rerun()
                 except Exception as e:
                     _clear_job(jid)
@@ -473,20 +610,12 @@ if app == "Mougli":
     colPrevA, colPrevB = st.columns(2)
     with colPrevA:
         if mon_paths:
-            total_mb = sum((p.stat().st_size for p in mon_paths if p.exists()), 0) / (1024*1024)
+            total_mb = sum(b for _, b in mon_staged) / (1024*1024)
             if total_mb > 15:
                 st.info("Monitor en bandeja es pesado: se omite preview para evitar cuelgues.")
             else:
                 try:
-                    buf = BytesIO()
-                    for i, p in enumerate(mon_paths):
-                        with p.open("rb") as f:
-                            if i > 0:
-                                buf.write(b"\n")
-                            buf.write(f.read())
-                    buf.seek(0); setattr(buf, "name", "monitor_preview.txt")
-                    df_m = _read_monitor_txt(buf)
-                    st.dataframe(_web_resumen_enriquecido(df_m, es_monitor=True), width="stretch")
+                    st.dataframe(_resumen_monitor_staged(_files_key(mon_paths)), width="stretch")
                 except MemoryError:
                     st.warning("Preview de Monitor omitido por tamaño (protección de memoria).")
                 except Exception as e:
@@ -495,14 +624,11 @@ if app == "Mougli":
     with colPrevB:
         if out_paths:
             try:
-                f0 = out_paths[0]
-                if f0.stat().st_size > MAX_PREVIEW_BYTES:
+                f0, f0_size = out_staged[0]
+                if f0_size > MAX_PREVIEW_BYTES:
                     st.info("OutView en bandeja es pesado: se omite preview para evitar cuelgues.")
                 else:
-                    with f0.open("rb") as fh:
-                        setattr(fh, "name", f0.name)
-                        df_o = _read_out_robusto(fh)
-                    st.dataframe(_web_resumen_enriquecido(df_o, es_monitor=False), width="stretch")
+                    st.dataframe(_resumen_outview_staged(_files_key([f0])), width="stretch")
             except MemoryError:
                 st.warning("Preview de OutView omitido por tamaño (protección de memoria).")
             except Exception as e:
@@ -527,87 +653,92 @@ elif app == "Mapito":
         show_borders = st.sidebar.checkbox("Mostrar bordes", value=True)
         show_basemap = st.sidebar.checkbox("Mostrar mapa base (OSM) en vista interactiva", value=True)
 
-        DATA_DIR = Path("data")
         try:
-            html, seleccion = build_map(
-                data_dir=DATA_DIR,
-                nivel="regiones",
-                colores={"fill": color_general, "selected": color_sel, "border": color_borde},
-                style={"weight": grosor, "show_borders": show_borders, "show_basemap": show_basemap},
+            html, meta = _build_map_cached(
+                str(MAPITO_DATA_DIR),
+                _gadm_version(MAPITO_DATA_DIR),
+                (("fill", color_general), ("selected", color_sel), ("border", color_borde)),
+                (("weight", grosor), ("show_borders", show_borders), ("show_basemap", show_basemap)),
             )
             st.components.v1.html(html, height=700, scrolling=False)
-            if seleccion:
-                st.caption(f"Elementos mostrados: {len(seleccion)}")
+            if meta.get("n_regions"):
+                st.caption(f"Elementos mostrados: {meta['n_regions']}")
         except Exception as e:
             st.error(f"No se pudo construir el mapa: {e}")
 
 # =============== A D M I N ===============
 elif app == "Admin" and is_admin:
-    st.header("Administración de usuarios")
-    st.caption(f"📦 Base de datos: `{_db_path()}`")
-
-    all_mods = [m["code"] for m in list_all_modules(enabled_only=False)]
-    users = list_users()
-
-    st.subheader("Usuarios")
-    if not users:
-        st.info("No hay usuarios registrados.")
-    emails = [u["email"] for u in users]
-    idx = st.selectbox("Selecciona un usuario para editar", options=["(nuevo)…"] + emails, index=0)
-
-    colA, colB = st.columns(2)
-
-    with colA:
-        st.markdown("### Crear usuario")
-        with st.form("create_user_form"):
-            c_email = st.text_input("Email")
-            c_name  = st.text_input("Nombre")
-            c_role  = st.selectbox("Rol", options=["admin", "programmer", "user"], index=2)
-            c_active = st.checkbox("Activo", value=True)
-            c_modules = st.multiselect("Módulos permitidos", all_mods, default=all_mods)
-            c_pwd   = st.text_input("Contraseña", type="password")
-            ok_new = st.form_submit_button("Crear")
-        if ok_new:
-            if not (c_email and c_name and c_pwd):
-                st.error("Completa email, nombre y contraseña.")
-            else:
-                try:
-                    create_user(
-                        email=c_email, name=c_name, role=c_role, pwd=c_pwd,
-                        active=c_active, modules=c_modules
-                    )
-                    st.success("Usuario creado.")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"No se pudo crear: {e}")
-
-    with colB:
-        st.markdown("### Editar usuario")
-        if idx != "(nuevo)…":
-            u = next((x for x in users if x["email"] == idx), None)
-            if u:
-                with st.form("edit_user_form"):
-                    e_name  = st.text_input("Nombre", value=u["name"])
-                    e_role  = st.selectbox("Rol", options=["admin", "programmer", "user"],
-                                           index=["admin","programmer","user"].index(u["role"]))
-                    e_active = st.checkbox("Activo", value=u["active"])
-                    e_modules = st.multiselect("Módulos permitidos", all_mods, default=u["modules"])
-                    e_newpwd = st.text_input("Nueva contraseña (opcional)", type="password")
-                    ok_edit = st.form_submit_button("Guardar cambios")
-                if ok_edit:
+    # Fragmento: elegir usuario o editar campos re-ejecuta solo este panel,
+    # no login, sidebar ni el resto de la app. Guardar sí hace rerun completo.
+    def _admin_panel():
+        st.header("Administración de usuarios")
+        st.caption(f"📦 Base de datos: `{_db_path()}`")
+
+        all_mods = _cached_module_codes()
+        users = list_users()
+
+        st.subheader("Usuarios")
+        if not users:
+            st.info("No hay usuarios registrados.")
+        emails = [u["email"] for u in users]
+        idx = st.selectbox("Selecciona un usuario para editar", options=["(nuevo)…"] + emails, index=0)
+
+        colA, colB = st.columns(2)
+
+        with colA:
+            st.markdown("### Crear usuario")
+            with st.form("create_user_form"):
+                c_email = st.text_input("Email")
+                c_name  = st.text_input("Nombre")
+                c_role  = st.selectbox("Rol", options=ROLES, index=ROLE_IDX["user"])
+                c_active = st.checkbox("Activo", value=True)
+                c_modules = st.multiselect("Módulos permitidos", all_mods, default=all_mods)
+                c_pwd   = st.text_input("Contraseña", type="password")
+                ok_new = st.form_submit_button("Crear")
+            if ok_new:
+                if not (c_email and c_name and c_pwd):
+                    st.error("Completa email, nombre y contraseña.")
+                else:
                     try:
-                        update_user(
-                            u["id"],
-                            name=e_name,
-                            role=e_role,
-                            active=e_active,
-                            modules=e_modules,
+                        create_user(
+                            email=c_email, name=c_name, role=c_role, pwd=c_pwd,
+                            active=c_active, modules=c_modules
                         )
-                        if e_newpwd:
-                            set_password(u["id"], e_newpwd)
-                        st.success("Cambios guardados.")
+                        st.toast("Usuario creado.", icon="✅")
                         st.rerun()
                     except Exception as e:
-                        st.error(f"No se pudo actualizar: {e}")
-            else:
-                st.info("Selecciona un usuario del listado para editar.")
+                        st.error(f"No se pudo crear: {e}")
+
+        with colB:
+            st.markdown("### Editar usuario")
+            if idx != "(nuevo)…":
+                u = next((x for x in users if x["email"] == idx), None)
+                if u:
+                    # Un rol fuera de ROLES se muestra tal cual para no reescribirlo sin querer
+                    e_roles = ROLES if u["role"] in ROLE_IDX else (*ROLES, u["role"])
+                    with st.form("edit_user_form"):
+                        e_name  = st.text_input("Nombre", value=u["name"])
+                        e_role  = st.selectbox("Rol", options=e_roles, index=e_roles.index(u["role"]))
+                        e_active = st.checkbox("Activo", value=u["active"])
+                        e_modules = st.multiselect("Módulos permitidos", all_mods, default=u["modules"])
+                        e_newpwd = st.text_input("Nueva contraseña (opcional)", type="password")
+                        ok_edit = st.form_submit_button("Guardar cambios")
+                    if ok_edit:
+                        try:
+                            update_user(
+                                u["id"],
+                                name=e_name,
+                                role=e_role if e_role != u["role"] else None,
+                                active=e_active,
+                                modules=e_modules,
+                            )
+                            if e_newpwd:
+                                set_password(u["id"], e_newpwd)
+                            st.toast("Cambios guardados.", icon="✅")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"No se pudo actualizar: {e}")
+                else:
+                    st.info("Selecciona un usuario del listado para editar.")
+
+    (_FRAGMENT(_admin_panel) if _FRAGMENT is not None else _admin_panel)()
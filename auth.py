@@ -418,10 +418,16 @@ def user_has_module(user: Optional[Dict[str, Any]], code: str) -> bool:
 
 
 # =========================== UI pública ===========================
-def _bootstrap_if_needed():
-    """Crea el admin inicial si la BD está vacía y registra módulos base."""
+@st.cache_resource(show_spinner=False)
+def _init_schema_once(db: str) -> bool:
+    """Esquema y módulos base: idempotentes, basta una vez por proceso y ruta de BD."""
     init_db()
     ensure_builtin_modules()
+    return True
+
+def _bootstrap_if_needed():
+    """Crea el admin inicial si la BD está vacía y registra módulos base."""
+    _init_schema_once(DB_PATH)
     if not admin_exists():
         st.info("No existe un administrador. Crea el primero para iniciar el sistema.")
         with st.form("create_admin", clear_on_submit=False):
@@ -446,7 +452,10 @@ def login_ui():
     token = q.get("tk") or q.get("token")
     if isinstance(token, list):
         token = token[0] if token else None
-    if token and not current_user():
+    # Cada token se verifica una sola vez por sesión: si no resolvió, los reruns
+    # de la pantalla de login no vuelven a consultar la BD con el mismo valor
+    if token and not current_user() and st.session_state.get("_tk_tried") != token:
+        st.session_state["_tk_tried"] = token
         u = user_from_token(token)
         if u:
             _set_user(u)
@@ -495,5 +504,6 @@ def logout_button(label: str = "Cerrar sesión"):
         return
     if st.button(label):
         _set_user(None)
+        st.session_state.pop("_tk_tried", None)
         _set_query_params()   # limpia parámetros (como tk)
         _safe_rerun()
@@ -1,19 +1,26 @@
 # core/mapito_core.py
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
 import json
+import re
 from typing import Iterable, Tuple, Dict, List, Any, Optional
 
 import folium
 from folium import GeoJson
 
+try:
+    import orjson as _orjson  # opcional: parseo 3-5× más rápido de los GeoJSON grandes
+except Exception:
+    _orjson = None
+
 
 # ───────────────────────────── Helpers ─────────────────────────────
 
-def _load_gadm(data_dir: Path, level: int) -> dict:
+def _gadm_file(data_dir: Path, level: int) -> Tuple[str, int]:
     """
-    Carga GADM para Perú:
+    Ruta y mtime del GADM para Perú (clave de los cachés):
       level=1 -> regiones   (gadm41_PER_1.json)
       level=2 -> provincias (gadm41_PER_2.json)
       level=3 -> distritos  (gadm41_PER_3.json)
@@ -24,9 +31,52 @@ def _load_gadm(data_dir: Path, level: int) -> dict:
         3: "gadm41_PER_3.json",
     }[level]
     p = data_dir / fname
-    if not p.exists():
-        raise FileNotFoundError(f"No existe {p}")
-    return json.loads(p.read_text(encoding="utf-8"))
+    try:
+        return str(p), p.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No existe {p}") from None
+
+
+def _load_gadm(data_dir: Path, level: int) -> dict:
+    """Carga el GADM del nivel indicado (ver `_gadm_file`)."""
+    return _load_gadm_cached(*_gadm_file(data_dir, level))
+
+
+COORD_DECIMALS = 5  # ~1.1 m en el ecuador: muy por debajo de un píxel del mapa
+
+
+def _parse_float_coord(s: str, _float=float, _round=round) -> float:
+    # Redondea durante el parseo (sin segundo recorrido); literales ya cortos pasan directo
+    return _round(_float(s), COORD_DECIMALS) if len(s) - s.find(".") > COORD_DECIMALS + 1 else _float(s)
+
+
+# Algún literal con más decimales de los necesarios (un falso positivo dentro de un string
+# solo hace tomar la ruta con redondeo, que da el mismo resultado)
+_LONG_DECIMAL = re.compile(rb"\.\d{%d}" % (COORD_DECIMALS + 1))
+
+
+@lru_cache(maxsize=6)
+def _load_gadm_cached(path: str, mtime_ns: int) -> dict:
+    # Un parseo por versión de archivo (mtime en la clave). El dict es compartido: no mutarlo.
+    raw = Path(path).read_bytes()
+    if _LONG_DECIMAL.search(raw):
+        return json.loads(raw, parse_float=_parse_float_coord)
+    # Precisión ya acotada (caso de los GADM incluidos): parseo directo, con orjson si está
+    if _orjson is not None:
+        return _orjson.loads(raw)
+    return json.loads(raw)
+
+
+@lru_cache(maxsize=6)
+def _gadm_name_keys(path: str, mtime_ns: int, depth: int) -> tuple:
+    """
+    Claves normalizadas por feature, en el orden del archivo: NAME_1 (depth=1) o la
+    tupla (NAME_1, …, NAME_depth). Se calculan una vez por versión del archivo.
+    """
+    fc = _load_gadm_cached(path, mtime_ns)
+    names = ("NAME_1", "NAME_2", "NAME_3")[:depth]
+    keys = [tuple(_to_lower_safe(_props(f).get(n)) for n in names) for f in fc["features"]]
+    return tuple(k[0] for k in keys) if depth == 1 else tuple(keys)
 
 
 def _props(f: dict) -> dict:
@@ -38,17 +88,6 @@ def _filter_fc(fc: dict, keep: Iterable[bool]) -> dict:
     return {"type": "FeatureCollection", "features": feats}
 
 
-def _match_names(props: dict, n1: Optional[str], n2: Optional[str], n3: Optional[str]) -> bool:
-    ok = True
-    if n1 is not None:
-        ok = ok and str(props.get("NAME_1", "")).strip().lower() == n1
-    if n2 is not None:
-        ok = ok and str(props.get("NAME_2", "")).strip().lower() == n2
-    if n3 is not None:
-        ok = ok and str(props.get("NAME_3", "")).strip().lower() == n3
-    return ok
-
-
 def _to_lower_safe(x: str) -> str:
     return (x or "").strip().lower()
 
@@ -115,75 +154,46 @@ def build_map(
         for (a, b, c) in (selections.get("districts") or [])
     ]
 
-    # Carga de GADM
-    gj1 = _load_gadm(data_dir, 1)  # regiones
-    gj2 = _load_gadm(data_dir, 2)  # provincias
-    gj3 = _load_gadm(data_dir, 3)  # distritos
-
-    # Qué pinto con "fill" (general) y qué con "selected"
+    # Qué pinto con "fill" (general) y qué con "selected".
+    # Cada nivel GADM se carga solo si la selección lo necesita.
     general_fc: dict
     selected_fc: dict | None = None
 
     if sel_dist:  # distritos seleccionados
-        # selected -> distritos exactos
-        keep_sel = [
-            _match_names(_props(f), n1, n2, n3) for (f) in gj3["features"]
-            for (n1, n2, n3) in [(_to_lower_safe(_props(f).get("NAME_1")),
-                                  _to_lower_safe(_props(f).get("NAME_2")),
-                                  _to_lower_safe(_props(f).get("NAME_3")))]
-        ]  # placeholder; lo reemplazaremos con set para O(1):
+        # selected -> distritos exactos (pertenencia O(1) en set)
+        f3, f2 = _gadm_file(data_dir, 3), _gadm_file(data_dir, 2)
         wanted_dist = set(sel_dist)
-        keep_sel = []
-        for f in gj3["features"]:
-            p = _props(f)
-            k = (_to_lower_safe(p.get("NAME_1")),
-                 _to_lower_safe(p.get("NAME_2")),
-                 _to_lower_safe(p.get("NAME_3")))
-            keep_sel.append(k in wanted_dist)
-        selected_fc = _filter_fc(gj3, keep_sel)
+        selected_fc = _filter_fc(_load_gadm_cached(*f3),
+                                 (k in wanted_dist for k in _gadm_name_keys(*f3, 3)))
 
         # general -> provincias contenedoras
         prov_needed = set((a, b) for (a, b, _) in sel_dist)
-        keep_gen = []
-        for f in gj2["features"]:
-            p = _props(f)
-            k = (_to_lower_safe(p.get("NAME_1")), _to_lower_safe(p.get("NAME_2")))
-            keep_gen.append(k in prov_needed)
-        general_fc = _filter_fc(gj2, keep_gen)
+        general_fc = _filter_fc(_load_gadm_cached(*f2),
+                                (k in prov_needed for k in _gadm_name_keys(*f2, 2)))
 
     elif sel_prov:  # provincias seleccionadas
         # selected -> provincias exactas
+        f2, f1 = _gadm_file(data_dir, 2), _gadm_file(data_dir, 1)
         wanted_prov = set(sel_prov)
-        keep_sel = []
-        for f in gj2["features"]:
-            p = _props(f)
-            k = (_to_lower_safe(p.get("NAME_1")), _to_lower_safe(p.get("NAME_2")))
-            keep_sel.append(k in wanted_prov)
-        selected_fc = _filter_fc(gj2, keep_sel)
+        selected_fc = _filter_fc(_load_gadm_cached(*f2),
+                                 (k in wanted_prov for k in _gadm_name_keys(*f2, 2)))
 
         # general -> regiones contenedoras
         regions_needed = set(a for (a, _) in sel_prov)
-        keep_gen = []
-        for f in gj1["features"]:
-            p = _props(f)
-            k = _to_lower_safe(p.get("NAME_1"))
-            keep_gen.append(k in regions_needed)
-        general_fc = _filter_fc(gj1, keep_gen)
+        general_fc = _filter_fc(_load_gadm_cached(*f1),
+                                (k in regions_needed for k in _gadm_name_keys(*f1, 1)))
 
     elif sel_regions:  # solo regiones
         # general -> regiones
+        f1 = _gadm_file(data_dir, 1)
         wanted_reg = set(sel_regions)
-        keep_gen = []
-        for f in gj1["features"]:
-            p = _props(f)
-            k = _to_lower_safe(p.get("NAME_1"))
-            keep_gen.append(k in wanted_reg)
-        general_fc = _filter_fc(gj1, keep_gen)
+        general_fc = _filter_fc(_load_gadm_cached(*f1),
+                                (k in wanted_reg for k in _gadm_name_keys(*f1, 1)))
         selected_fc = None
 
     else:
         # Nada seleccionado: muestro todo Perú (regiones)
-        general_fc = gj1
+        general_fc = _load_gadm(data_dir, 1)
         selected_fc = None
 
     # Construcción del mapa
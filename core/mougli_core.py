@@ -7,9 +7,11 @@ import os
 import sys
 import json
 import csv
-import gc
 import argparse
+import datetime
+import shutil
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO, StringIO
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
@@ -75,6 +77,26 @@ def _decode_bytes(b: bytes) -> str:
     raise ValueError("No fue posible decodificar el TXT.")
 
 
+def _arrow_temporal(df: pd.DataFrame) -> bool:
+    """True si Arrow infirió fechas/horas (HH:MM, ISO) que los parsers C/Python dejan como texto."""
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_datetime64_any_dtype(s) or pd.api.types.is_timedelta64_dtype(s):
+            return True
+        if s.dtype == object:
+            i = s.first_valid_index()
+            if i is not None and isinstance(s.loc[i], (datetime.date, datetime.time)):
+                return True
+    return False
+
+
+def _factorize_str(s: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """Códigos por fila + valores distintos como texto; los faltantes siguen como NaN (último slot)."""
+    codes, uniq = pd.factorize(s, use_na_sentinel=True)
+    codes = np.where(codes < 0, len(uniq), codes)
+    return codes, pd.Index([str(v) for v in uniq] + [np.nan], dtype=object)
+
+
 def _col_letter(idx: int) -> str:
     s = ""
     n = idx
@@ -102,8 +124,24 @@ def _read_monitor_txt(file) -> pd.DataFrame:
     if hdr_idx is None:
         return pd.DataFrame({"linea": [l for l in lines if l.strip()]})
 
-    buf = StringIO("\n".join(lines[hdr_idx:]))
-    df = pd.read_csv(buf, sep="|", engine="python")
+    body = "\n".join(lines[hdr_idx:])
+    try:
+        # pyarrow: parser multihilo, varias veces más rápido que el C de pandas en TXT grandes
+        import pyarrow  # noqa: F401
+        df = pd.read_csv(StringIO(body), sep="|", engine="pyarrow")
+        if not df.columns.is_unique:
+            # Arrow no renombra cabeceras repetidas (MARCA, MARCA.1, ...): mejor el parser C
+            raise ValueError("Cabeceras duplicadas en el TXT de Monitor.")
+        if _arrow_temporal(df):
+            # HORA/DURACION como datetime.time cambiarían el Excel: deben seguir como texto
+            raise ValueError("Arrow infirió columnas de fecha/hora en el TXT de Monitor.")
+        # Arrow devuelve None en celdas de texto vacías; se normaliza a NaN como el parser C
+        obj = df.columns[df.dtypes == object]
+        df[obj] = df[obj].where(df[obj].notna(), np.nan)
+    except Exception:
+        # Sin pyarrow, cabeceras duplicadas, fechas/horas inferidas o filas irregulares que Arrow rechaza: parser C de pandas.
+        # low_memory=False infiere tipos sobre la columna completa, como hacía el parser Python
+        df = pd.read_csv(StringIO(body), sep="|", engine="c", low_memory=False)
 
     df.columns = df.columns.astype(str).str.strip()
     df = df.dropna(axis=1, how="all")
@@ -122,7 +160,9 @@ def _read_monitor_txt(file) -> pd.DataFrame:
         df["SEMANA"] = df["DIA"].dt.isocalendar().week
 
     if "MEDIO" in df.columns:
-        df["MEDIO"] = df["MEDIO"].astype(str).str.upper().str.strip()
+        # Normaliza solo los valores distintos y re-expande por códigos
+        codes, medios = _factorize_str(df["MEDIO"])
+        df["MEDIO"] = medios.str.upper().str.strip().to_numpy()[codes]
 
     if "INVERSION" in df.columns:
         df["INVERSION"] = pd.to_numeric(df["INVERSION"], errors="coerce").fillna(0)
@@ -242,7 +282,10 @@ def _aplicar_factores_monitor(df: pd.DataFrame, factores: Dict[str, float]) -> p
         clave = mapa.get(m, None)
         return float(factores.get(clave, 1.0)) if clave else 1.0
 
-    df["INVERSION"] = df.apply(lambda r: r["INVERSION"] * fx(r["MEDIO"]), axis=1)
+    # Un factor por MEDIO distinto, reexpandido por códigos (en vez de apply fila a fila)
+    codes, medios = _factorize_str(df["MEDIO"])
+    fx_por_medio = np.array([fx(m) for m in medios], dtype=float)
+    df["INVERSION"] = df["INVERSION"] * fx_por_medio[codes]
     return df
 
 
@@ -399,8 +442,11 @@ def _transform_outview_enriquecido(df: pd.DataFrame, *, factor_outview: float) -
         "PARADERO": 800, "PRISMA": 2800, "QUIOSCO": 600, "RELOJ": 840,
         "TORRE UNIPOLAR": 3000, "TOTEM": 950, "VALLA": 600, "VALLA ALTA": 1300
     }
-    tipo_up = df.get("Tipo Elemento", "").astype(str).str.upper()
-    tope = tipo_up.map(tipo_to_base).astype(float) * (4.0/3.0)
+    # Normaliza/mapea solo los tipos distintos y reexpande por códigos
+    tipo_codes, tipo_u = _factorize_str(df["Tipo Elemento"])
+    tipo_u = tipo_u.str.upper()
+    tope = tipo_u.map(tipo_to_base).to_numpy(dtype=float)[tipo_codes] * (4.0/3.0)
+    es_led = (tipo_u == "PANTALLA LED")[tipo_codes]
     df["TopeTipo_AQ"] = tope
     an_val = pd.to_numeric(df["Suma_AM_Z_AB_AI"], errors="coerce")
     df["Suma_AM_Topada_Tipo"] = np.where(np.isnan(tope), an_val, np.minimum(an_val, tope))
@@ -412,7 +458,7 @@ def _transform_outview_enriquecido(df: pd.DataFrame, *, factor_outview: float) -
         0.0
     )
     df["Tarifa Real ($)"] = np.where(
-        tipo_up == "PANTALLA LED",
+        es_led,
         df["SumaTopada_div_ConteoZ"] * 0.4,
         df["SumaTopada_div_ConteoZ"] * 0.8
     )
@@ -677,32 +723,103 @@ def _progress(progress_path: Path, status: str, step: int, total: int, message:
     })
 
 
-def _xlsx_to_csv_stream(xlsx_path: Path, csv_writer: csv.writer) -> None:
-    """Convierte la PRIMERA hoja a CSV por streaming (sin cargar todo en memoria)."""
+def _norm_header(row) -> List[str]:
+    return ["" if h is None else str(h).replace("\ufeff", "").strip() for h in row]
+
+
+def _csv_delim(line: str) -> str:
+    """Separador de una cabecera CSV: ';' (export regional de OutView) o ','."""
+    return ";" if line.count(";") > line.count(",") else ","
+
+
+def _row_projector(src: List[str], schema: List[str]):
+    """
+    Reordena filas de un archivo con cabecera `src` al `schema` del primero.
+    None si ya coinciden o si no comparten ninguna columna (esas filas se agregan tal cual).
+    """
+    if src == schema or not set(src) & set(schema):
+        return None
+    pos = {h: i for i, h in enumerate(src)}
+    idx = [pos.get(h) for h in schema]
+    return lambda r: ["" if (i is None or i >= len(r)) else r[i] for i in idx]
+
+
+def _unrelated_header(header: List[str], schema: List[str], origen: str,
+                      log_path: Optional[Path]) -> bool:
+    """True (y lo registra) si la cabecera no comparte columnas con el esquema del combinado."""
+    if header == schema or set(header) & set(schema):
+        return False
+    if log_path is not None:
+        _log_append(log_path, f"Aviso: {origen} no comparte columnas con el primer archivo; se agrega sin alinear.")
+    return True
+
+
+def _xlsx_to_csv_stream(xlsx_path: Path, csv_writer: csv.writer,
+                        schema: Optional[List[str]] = None,
+                        log_path: Optional[Path] = None) -> Optional[List[str]]:
+    """
+    Convierte la PRIMERA hoja a CSV por streaming (sin cargar todo en memoria).
+    Sin `schema` escribe la cabecera y la devuelve; con `schema` alinea las filas a esas columnas
+    (si no comparte ninguna, escribe cabecera y filas tal cual, como antes).
+    """
     try:
         from openpyxl import load_workbook
     except Exception:
         df = pd.read_excel(xlsx_path, engine="openpyxl")
-        for i, row in enumerate(df.itertuples(index=False, name=None)):
-            if i == 0:
-                csv_writer.writerow(list(df.columns))
-            csv_writer.writerow(list(row))
-        return
+        header = _norm_header(df.columns)
+        rows = df.itertuples(index=False, name=None)
+        if schema is None or _unrelated_header(header, schema, xlsx_path.name, log_path):
+            csv_writer.writerow(header)
+            schema = schema or header
+        proj = _row_projector(header, schema)
+        csv_writer.writerows(rows if proj is None else map(proj, rows))
+        return schema
 
     wb = load_workbook(filename=str(xlsx_path), read_only=True, data_only=True)
-    ws = wb.active
-    first = True
-    for r in ws.iter_rows(values_only=True):
-        if first:
-            headers = [str(x) if x is not None else "" for x in r]
-            csv_writer.writerow(headers)
-            first = False
-        else:
-            csv_writer.writerow(["" if x is None else x for x in r])
     try:
-        wb.close()
-    except Exception:
-        pass
+        rows = wb.active.iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            return schema
+        header = _norm_header(first)
+        if schema is None or _unrelated_header(header, schema, xlsx_path.name, log_path):
+            csv_writer.writerow(header)
+            schema = schema or header
+        # Mismo esquema (caso común): writerows consume el iterador en C; csv ya escribe None como ""
+        proj = _row_projector(header, schema)
+        csv_writer.writerows(rows if proj is None else map(proj, rows))
+        return schema
+    finally:
+        try:
+            wb.close()
+        except Exception:
+            pass
+
+
+_KERNEL_COPY = getattr(os, "copy_file_range", None) or getattr(os, "sendfile", None)
+
+
+def _copy_file_into(r, w):
+    """
+    Copia el resto de `r` al final de `w` dentro del kernel (copy_file_range/sendfile) cuando
+    el SO lo permite; si no, o si falla, completa por bloques de 1 MiB en espacio de usuario.
+    """
+    w.flush()  # lo ya escrito en el buffer debe quedar antes de la copia en kernel
+    if _KERNEL_COPY is not None:
+        try:
+            in_fd, out_fd = r.fileno(), w.fileno()
+            remaining = os.fstat(in_fd).st_size - os.lseek(in_fd, 0, os.SEEK_CUR)
+            while remaining > 0:
+                if _KERNEL_COPY is os.sendfile:
+                    n = os.sendfile(out_fd, in_fd, None, remaining)
+                else:
+                    n = _KERNEL_COPY(in_fd, out_fd, remaining)
+                if n == 0:
+                    break
+                remaining -= n
+        except OSError:
+            pass  # p.ej. EXDEV/ENOSYS: lo que falte va por la ruta genérica
+    shutil.copyfileobj(r, w, 1024 * 1024)
 
 
 def _combine_monitor_txt(inputs: List[Path], out_txt: Path):
@@ -712,31 +829,57 @@ def _combine_monitor_txt(inputs: List[Path], out_txt: Path):
             with p.open("rb") as r:
                 if i > 0:
                     w.write(b"\n")
-                for chunk in iter(lambda: r.read(1024 * 1024), b""):
-                    w.write(chunk)
+                _copy_file_into(r, w)
 
 
-def _combine_outview_to_csv(inputs: List[Path], out_csv: Path):
+def _append_csv_text(first: str, f_in, f_out, csv_writer: csv.writer,
+                     schema: Optional[List[str]] = None,
+                     log_path: Optional[Path] = None) -> Optional[List[str]]:
+    """
+    Agrega un CSV (`first` = su cabecera ya leída) al combinado. Si su cabecera y separador
+    coinciden con los del combinado, copia el texto por bloques (sin re-parsear filas); si comparte
+    columnas, re-ordena por nombre; si no comparte ninguna, copia las filas tal cual y lo registra.
+    Devuelve el esquema vigente.
+    """
+    if not first:
+        return schema  # archivo vacío
+    delim = _csv_delim(first)
+    header = _norm_header(next(csv.reader([first], delimiter=delim), []))
+    if schema is None:
+        f_out.write(first if first.endswith(("\n", "\r")) else first + "\n")
+        schema = header
+    elif not _unrelated_header(header, schema, os.path.basename(getattr(f_in, "name", "CSV")), log_path):
+        proj = _row_projector(header, schema)
+        if proj is not None or delim != csv_writer.dialect.delimiter:
+            rows = filter(None, csv.reader(f_in, delimiter=delim))  # sin filas vacías
+            csv_writer.writerows(rows if proj is None else map(proj, rows))
+            return schema
+    last = ""
+    for chunk in iter(lambda: f_in.read(1024 * 1024), ""):
+        f_out.write(chunk)
+        last = chunk[-1]
+    if last and last not in "\r\n":
+        f_out.write("\n")  # evita pegar la última fila con la primera del siguiente archivo
+    return schema
+
+
+def _combine_outview_to_csv(inputs: List[Path], out_csv: Path, log_path: Optional[Path] = None):
     out_csv.parent.mkdir(parents=True, exist_ok=True)
     with out_csv.open("w", newline="", encoding="utf-8") as f_out:
-        writer = csv.writer(f_out)
-        wrote_header = False
+        writer: Optional[csv.writer] = None  # usa el separador del primer archivo
+        schema: Optional[List[str]] = None  # cabecera del primer archivo; los demás se alinean a ella
         for p in inputs:
             name = p.name.lower()
             if name.endswith(".csv"):
                 with p.open("r", encoding="utf-8", errors="ignore", newline="") as f_in:
-                    reader = csv.reader(f_in)
-                    for i, row in enumerate(reader):
-                        if i == 0:
-                            if wrote_header:
-                                continue
-                            wrote_header = True
-                        writer.writerow(row)
+                    first = f_in.readline()
+                    if writer is None:
+                        writer = csv.writer(f_out, delimiter=_csv_delim(first))
+                    schema = _append_csv_text(first, f_in, f_out, writer, schema, log_path)
             else:
-                if not wrote_header:
-                    pass
-                _xlsx_to_csv_stream(p, writer)
-                wrote_header = True
+                if writer is None:
+                    writer = csv.writer(f_out)
+                schema = _xlsx_to_csv_stream(p, writer, schema, log_path)
 
 
 def worker_run(args):
@@ -755,16 +898,21 @@ def worker_run(args):
         comb_mon = job_dir / "combined_monitor.txt" if mon_inputs else None
         comb_out = job_dir / "combined_outview.csv" if out_inputs else None
 
+        # Monitor es copia pura de bytes (libera el GIL): corre en paralelo a la conversión de OutView
         step = 1
-        if mon_inputs:
-            _progress(progress, "running", step, total_steps, "Combinando Monitor…")
-            _combine_monitor_txt(mon_inputs, comb_mon)
-            _log_append(logf, f"Monitor combinado en {comb_mon}")
-        step += 1
-        if out_inputs:
-            _progress(progress, "running", step, total_steps, "Combinando OutView…")
-            _combine_outview_to_csv(out_inputs, comb_out)
-            _log_append(logf, f"OutView combinado en {comb_out}")
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            fut_mon = None
+            if mon_inputs:
+                _progress(progress, "running", step, total_steps, "Combinando Monitor…")
+                fut_mon = ex.submit(_combine_monitor_txt, mon_inputs, comb_mon)
+            step += 1
+            if out_inputs:
+                _progress(progress, "running", step, total_steps, "Combinando OutView…")
+                _combine_outview_to_csv(out_inputs, comb_out, logf)
+                _log_append(logf, f"OutView combinado en {comb_out}")
+            if fut_mon is not None:
+                fut_mon.result()
+                _log_append(logf, f"Monitor combinado en {comb_mon}")
         step += 1
 
         _progress(progress, "running", step, total_steps, "Procesando cálculos…")
@@ -793,8 +941,6 @@ def worker_run(args):
         _progress(progress, "done", step, total_steps, "Completado")
         _log_append(logf, f"Éxito: {outxlsx}")
 
-        gc.collect()
-
     except Exception as e:
         _log_append(logf, "ERROR:\n" + "".join(traceback.format_exception(e)))
         _progress(progress, "error", 1, 1, f"{type(e).__name__}: {e}")
@@ -0,0 +1,70 @@
+import csv
+import sys
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from core.mougli_core import _combine_outview_to_csv, _read_monitor_txt
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def _rows(path):
+    with path.open(encoding="utf-8", newline="") as f:
+        return list(csv.reader(f, delimiter=";"))
+
+
+def test_combine_outview_semicolon_extra_column(tmp_path):
+    a = _write(tmp_path / "a.csv", "Fecha;Marca;Tipo Elemento;Tarifa S/.\n01/01/2024;X;PANEL;1.234,50\n")
+    b = _write(tmp_path / "b.csv",
+               "Fecha;Marca;Tipo Elemento;Tarifa S/.;Extra\n"
+               "02/01/2024;Y;PANEL;10,00;e1\n03/01/2024;Z;VALLA;20,00;e2\n")
+    out = tmp_path / "out.csv"
+    _combine_outview_to_csv([a, b], out)
+    assert _rows(out) == [
+        ["Fecha", "Marca", "Tipo Elemento", "Tarifa S/."],
+        ["01/01/2024", "X", "PANEL", "1.234,50"],
+        ["02/01/2024", "Y", "PANEL", "10,00"],
+        ["03/01/2024", "Z", "VALLA", "20,00"],
+    ]
+
+
+def test_combine_outview_semicolon_reordered_columns(tmp_path):
+    a = _write(tmp_path / "a.csv", "Fecha;Marca;Tarifa S/.\n01/01/2024;X;1.234,50\n")
+    b = _write(tmp_path / "b.csv", "Tarifa S/.;Fecha;Marca\n10,00;02/01/2024;Y\n")
+    out = tmp_path / "out.csv"
+    _combine_outview_to_csv([a, b], out)
+    assert _rows(out) == [
+        ["Fecha", "Marca", "Tarifa S/."],
+        ["01/01/2024", "X", "1.234,50"],
+        ["02/01/2024", "Y", "10,00"],
+    ]
+
+
+def test_combine_outview_unrelated_header_is_appended_raw(tmp_path):
+    a = _write(tmp_path / "a.csv", "Fecha;Marca\n01/01/2024;X\n")
+    b = _write(tmp_path / "b.csv", "Otra;Cosa\nv1;v2\n")
+    out = tmp_path / "out.csv"
+    log = tmp_path / "log.txt"
+    _combine_outview_to_csv([a, b], out, log)
+    assert _rows(out) == [["Fecha", "Marca"], ["01/01/2024", "X"], ["v1", "v2"]]
+    assert "b.csv" in log.read_text(encoding="utf-8")
+
+
+def test_read_monitor_txt_pyarrow_matches_c_engine(monkeypatch):
+    pytest.importorskip("pyarrow")
+    txt = (
+        "Reporte Monitor\n"
+        "#|DIA|MEDIO|MARCA|HORA|DURACION|SECTOR|INVERSION\n"
+        "1|01/02/2024|tv|A|08:06|00:30||100\n"
+        "2|02/02/2024|Radio|B|21:15:10|00:20|BANCA|50.5\n"
+    ).encode("utf-8")
+    arrow = _read_monitor_txt(BytesIO(txt))
+    monkeypatch.setitem(sys.modules, "pyarrow", None)  # fuerza el parser C
+    c_engine = _read_monitor_txt(BytesIO(txt))
+    pd.testing.assert_frame_equal(arrow, c_engine)
+    assert arrow["HORA"].tolist() == ["08:06", "21:15:10"]